@@ -5,6 +5,10 @@ import sys
 import StringIO
 import csv
 import json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 import re
 import time
 from operator import itemgetter
@@ -53,6 +57,9 @@ class DatimImap(object):
         IMAP_FIELD_DATIM_DISAG_ID,
     ]
 
+    # Frozenset of the required fields used for the per-row presence check in is_valid
+    IMAP_REQUIRED_FIELD_SET = frozenset(IMAP_REQUIRED_FIELD_NAMES)
+
     # The list of required IMAP export fields (other fields discarded during export unless
     # "extra" fields requested)
     IMAP_EXPORT_FIELD_NAMES = list(IMAP_IMPORT_FIELD_NAMES) + [IMAP_FIELD_MOH_CLASSIFICATION]
@@ -123,6 +130,9 @@ class DatimImap(object):
         DATIM_IMAP_FORMAT_HTML
     ]
 
+    # Lowercase lookup of the supported formats used by get_format_from_string
+    DATIM_IMAP_FORMATS_BY_LOWER = dict((fmt.lower(), fmt) for fmt in DATIM_IMAP_FORMATS)
+
     # Prefixes added to country data element/disag IDs in OCL to allow reuse of the local IMAP IDs
     # by different resource types
     IMAP_MOH_DATA_ELEMENT_ID_PREFIX = 'de-'
@@ -173,10 +183,7 @@ class DatimImap(object):
         :param default_fmt:
         :return:
         """
-        for fmt in DatimImap.DATIM_IMAP_FORMATS:
-            if format_string.lower() == fmt.lower():
-                return fmt
-        return default_fmt
+        return DatimImap.DATIM_IMAP_FORMATS_BY_LOWER.get(format_string.lower(), default_fmt)
 
     def get_row(self, row_number, include_extra_info=False, exclude_classification=False,
                 auto_fix_null_disag=True, convert_to_dict=False, exclude_empty_maps=False,
@@ -382,13 +389,16 @@ class DatimImap(object):
 
     def set_imap_data(self, imap_data):
         """
-        Sets the IMAP data, discarding unrecognized columns, and ensures unicode encoding
-        :param imap_data: csv.DictReader or python dictionary
+        Sets the IMAP data, discarding unrecognized columns, and ensures unicode encoding.
+        Accepts a csv.DictReader or any iterable of row dictionaries (e.g. list, tuple,
+        or generator), so callers can stream rows without materializing a list first.
+        :param imap_data: csv.DictReader or iterable of row dictionaries
         :return:
         """
         # TODO: Fix the explicit UTF-8 character encoding and ignoring unicode decoding errors
         self.__imap_data = []
-        if isinstance(imap_data, csv.DictReader) or type(imap_data) == type([]):
+        if isinstance(imap_data, csv.DictReader) or (
+                hasattr(imap_data, '__iter__') and not isinstance(imap_data, dict)):
             for row in imap_data:
                 # Get rid of unrecognized columns and ensure unicode encoding
                 row_to_save = {}
@@ -430,15 +440,17 @@ class DatimImap(object):
         if not self.__imap_data:
             return True
 
-        # Check for missing fields
-        line_number = 0
-        for row in self.__imap_data:
-            line_number += 1
-            for field_name in self.IMAP_REQUIRED_FIELD_NAMES:
-                if field_name not in row or not row[field_name]:
-                    err_msg = "ERROR: Missing or empty required field '%s' on row %s of IMAP" % (
-                        field_name, line_number)
-                    errors.append(err_msg)
+        # Check for missing fields - a single set difference per row replaces the
+        # per-field membership tests
+        for line_number, row in enumerate(self.__imap_data, 1):
+            missing_fields = self.IMAP_REQUIRED_FIELD_SET.difference(
+                field_name for field_name in row if row[field_name])
+            if missing_fields:
+                for field_name in self.IMAP_REQUIRED_FIELD_NAMES:
+                    if field_name in missing_fields:
+                        err_msg = "ERROR: Missing or empty required field '%s' on row %s of IMAP" % (
+                            field_name, line_number)
+                        errors.append(err_msg)
 
         # Verify DATIM Data Element/Disag IDs are valid (if datim_moh_source_export provided)
         if datim_moh_source_export:
@@ -528,18 +540,26 @@ class DatimImap(object):
                 fieldnames += list(self.IMAP_EXTRA_FIELD_NAMES)
             writer = csv.DictWriter(sys.stdout, fieldnames=fieldnames)
             writer.writeheader()
-            for row in data:
-                # throw out columns we don't need
-                row_to_output = {}
-                for field_name in fieldnames:
-                    if row[field_name] is None:
-                        row_to_output[field_name] = None
-                    else:
-                        row_to_output[field_name] = row[field_name].encode('utf8')
-                # output the row
-                writer.writerow(row_to_output)
+            if sys.version_info[0] >= 3:
+                # Python 3 csv writes unicode natively, so only the column projection is
+                # needed - rows may carry extra columns (e.g. from add_columns_to_row)
+                # that are not part of the output fieldnames
+                writer.writerows(
+                    {field_name: row[field_name] for field_name in fieldnames}
+                    for row in data)
+            else:
+                # Only keep the columns we need and let writerows drive the row loop at
+                # the C level instead of calling writerow once per row
+                writer.writerows(
+                    {field_name: (None if row[field_name] is None
+                                  else row[field_name].encode('utf8'))
+                     for field_name in fieldnames}
+                    for row in data)
         elif fmt == self.DATIM_IMAP_FORMAT_JSON:
-            print(json.dumps(data))
+            if orjson:
+                print(orjson.dumps(data).decode('utf8'))
+            else:
+                print(json.dumps(data))
         elif fmt == self.DATIM_IMAP_FORMAT_HTML:
             print('<h1>Country IMAP Export for Country Code "%s" and Period "%s"</h1>' % (
                 self.country_code, self.period))
@@ -850,12 +870,7 @@ class DatimImapFactory(object):
 
     @staticmethod
     def _convert_endpoint_to_filename_fmt(endpoint):
-        filename = endpoint.replace('/', '-')
-        if filename[0] == '-':
-            filename = filename[1:]
-        if filename[-1] == '-':
-            filename = filename[:-1]
-        return filename
+        return endpoint.strip('/').replace('/', '-')
 
     @staticmethod
     def endpoint2filename_ocl_export_zip(endpoint):
@@ -1064,9 +1079,25 @@ class DatimImapFactory(object):
         :return:
         """
         with open(csv_filename, 'rb') as input_file:
-            imap_data = csv.DictReader(input_file)
-            return DatimImap(imap_data=imap_data, country_code=country_code,
-                             country_name=country_name, country_org=country_org, period=period)
+            reader = csv.reader(input_file)
+            try:
+                header = next(reader)
+            except StopIteration:
+                header = []
+
+            # Map each recognized column to its position in the header so that rows are
+            # built with positional access rather than a keyed DictReader lookup per field.
+            # All rows are materialized before the file is closed. Empty rows are skipped,
+            # matching csv.DictReader behavior.
+            column_indexes = [(field_name, header.index(field_name))
+                              for field_name in DatimImap.IMAP_EXPORT_FIELD_NAMES
+                              if field_name in header]
+            imap_data = [
+                {field_name: (row[index] if index < len(row) else '')
+                 for field_name, index in column_indexes}
+                for row in reader if row]
+        return DatimImap(imap_data=imap_data, country_code=country_code,
+                         country_name=country_name, country_org=country_org, period=period)
 
     @staticmethod
     def load_imap_from_ocl(oclenv='', oclapitoken='', run_ocl_offline=False,
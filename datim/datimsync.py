@@ -14,6 +14,10 @@ Import batches should be structured as follows:
 }
 """
 import json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 import requests
 import os
 import sys
@@ -125,7 +129,7 @@ class DatimSync(datimbase.DatimBase):
             cleaning_method_name = export_def.get('cleaning_method', self.DEFAULT_OCL_EXPORT_CLEANING_METHOD)
             getattr(self, cleaning_method_name)(export_def, cleaning_attr=cleaning_attr)
         with open(self.attach_absolute_data_path(self.OCL_CLEANED_EXPORT_FILENAME), 'wb') as output_file:
-            output_file.write(json.dumps(self.ocl_diff))
+            DatimSync.write_diff_to_file(self.ocl_diff, output_file)
             self.vlog(1, 'Cleaned OCL exports successfully written to "%s"' % (
                 self.OCL_CLEANED_EXPORT_FILENAME))
 
@@ -242,7 +246,7 @@ class DatimSync(datimbase.DatimBase):
         import_batch_key = ocl_export_def['import_batch']
         json_filename = datimbase.DatimBase.endpoint2filename_ocl_export_json(ocl_export_def['endpoint'])
         with open(self.attach_absolute_data_path(json_filename), 'rb') as input_file:
-            ocl_repo_export_raw = json.load(input_file)
+            ocl_repo_export_raw = DatimSync.load_json_file(input_file)
 
             if ocl_repo_export_raw['type'] in ['Source', 'Source Version']:
 
@@ -287,6 +291,58 @@ class DatimSync(datimbase.DatimBase):
                 self.vlog(1, 'Cleaned %s concept references and skipped %s mapping references' % (
                     num_concept_refs, num_mapping_refs))
 
+    @staticmethod
+    def load_json_file(input_file):
+        """
+        Parse a JSON document from a file handle opened in binary mode. orjson consumes
+        the raw bytes buffer directly, skipping the bytes-to-str decode pass (and its
+        extra full-size copy of the document) that stdlib json.load performs.
+        :param input_file: File handle opened in binary read mode
+        :return: Parsed JSON document
+        """
+        if orjson:
+            return orjson.loads(input_file.read())
+        return json.load(input_file)
+
+    @staticmethod
+    def write_diff_to_file(diff, output_file):
+        """
+        Serialize a diff dictionary ({import_batch: {resource_type: {key: resource}}}) to
+        an open binary file one resource at a time. This emits the same JSON document as
+        dumping the entire diff in one call, but only ever materializes one resource's
+        JSON in memory, with the writes absorbed by the file's buffer.
+        :param diff: Diff dictionary to serialize
+        :param output_file: File handle opened in binary write mode
+        :return: None
+        """
+        if orjson:
+            dumps = orjson.dumps
+        else:
+            def dumps(obj):
+                return json.dumps(obj).encode('utf-8')
+        output_file.write(b'{')
+        for batch_index, import_batch_key in enumerate(diff):
+            if batch_index:
+                output_file.write(b',')
+            output_file.write(dumps(import_batch_key))
+            output_file.write(b':{')
+            batch = diff[import_batch_key]
+            for resource_type_index, resource_type in enumerate(batch):
+                if resource_type_index:
+                    output_file.write(b',')
+                output_file.write(dumps(resource_type))
+                output_file.write(b':{')
+                resources = batch[resource_type]
+                for resource_index, resource_key in enumerate(resources):
+                    if resource_index:
+                        output_file.write(b',')
+                    output_file.write(dumps(resource_key))
+                    output_file.write(b':')
+                    output_file.write(dumps(resources[resource_key]))
+                output_file.write(b'}')
+            output_file.write(b'}')
+        output_file.write(b'}')
+
     def cache_dhis2_exports(self):
         """
         ...and delete old DHIS2 cached files if there
@@ -317,7 +373,7 @@ class DatimSync(datimbase.DatimBase):
             self.vlog(1, '** [DHIS2 Export %s of %s] %s:' % (cnt, len(self.DHIS2_QUERIES), dhis2_query_key))
             getattr(self, dhis2_query_def['conversion_method'])(dhis2_query_def, conversion_attr=conversion_attr)
         with open(self.attach_absolute_data_path(self.DHIS2_CONVERTED_EXPORT_FILENAME), 'wb') as output_file:
-            output_file.write(json.dumps(self.dhis2_diff))
+            DatimSync.write_diff_to_file(self.dhis2_diff, output_file)
             self.vlog(1, 'Transformed DHIS2 exports successfully written to "%s"' % (
                 self.DHIS2_CONVERTED_EXPORT_FILENAME))
 
@@ -730,8 +786,8 @@ class DatimSync(datimbase.DatimBase):
         self.vlog(1, '**** STEP 7 of 12: Perform deep diff')
         with open(self.attach_absolute_data_path(self.OCL_CLEANED_EXPORT_FILENAME), 'rb') as file_ocl_diff,\
                 open(self.attach_absolute_data_path(self.DHIS2_CONVERTED_EXPORT_FILENAME), 'rb') as file_dhis2_diff:
-            local_ocl_diff = json.load(file_ocl_diff)
-            local_dhis2_diff = json.load(file_dhis2_diff)
+            local_ocl_diff = DatimSync.load_json_file(file_ocl_diff)
+            local_dhis2_diff = DatimSync.load_json_file(file_dhis2_diff)
 
             # JP: This is a slight hack, but gets the job done
             # Clear OCL content if not comparing to previous import to generate a full import script
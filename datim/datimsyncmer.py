@@ -15,6 +15,16 @@ from __future__ import with_statement
 import os
 import sys
 import json
+import collections
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ijson
+except ImportError:
+    ijson = None
+import datimbase
 import datimsync
 import datimconstants
 
@@ -44,6 +54,75 @@ class DatimSyncMer(datimsync.DatimSync):
     # OCL Export Definitions
     OCL_EXPORT_DEFS = datimconstants.DatimConstants.MER_OCL_EXPORT_DEFS
 
+    # URL stems for MER concepts and mappings, hoisted out of the dhis2diff_mer loop
+    CONCEPT_URL_PREFIX = '/orgs/PEPFAR/sources/MER/concepts/'
+    MAPPING_KEY_PREFIX = '/orgs/PEPFAR/sources/MER/mappings/?from='
+
+    # Templates for the invariant fields of the resources built by dhis2diff_mer.
+    # The loop populates a copy of the relevant template with the per-record fields
+    # rather than rebuilding the constant keys for every DataElement and disaggregate.
+    INDICATOR_CONCEPT_TEMPLATE = {
+        'type': 'Concept',
+        'id': '',
+        'concept_class': 'Indicator',
+        'datatype': 'Numeric',
+        'owner': 'PEPFAR',
+        'owner_type': datimbase.DatimBase.RESOURCE_TYPE_ORGANIZATION,
+        'source': 'MER',
+        'retired': False,
+        'external_id': '',
+        'descriptions': None,
+        'extras': None,
+        'names': None,
+    }
+    DISAGGREGATE_CONCEPT_TEMPLATE = {
+        'type': 'Concept',
+        'id': '',
+        'concept_class': 'Disaggregate',
+        'datatype': 'None',
+        'owner': 'PEPFAR',
+        'owner_type': datimbase.DatimBase.RESOURCE_TYPE_ORGANIZATION,
+        'source': 'MER',
+        'retired': False,
+        'descriptions': None,
+        'external_id': '',
+        'extras': None,
+        'names': None,
+    }
+    DISAGGREGATE_MAPPING_TEMPLATE = {
+        'type': 'Mapping',
+        'owner': 'PEPFAR',
+        'owner_type': datimbase.DatimBase.RESOURCE_TYPE_ORGANIZATION,
+        'source': 'MER',
+        'map_type': 'Has Option',
+        'from_concept_url': '',
+        'to_concept_url': '',
+        'external_id': None,
+        'extras': None,
+        'retired': False,
+    }
+    FULLY_SPECIFIED_NAME_TEMPLATE = {
+        'name': '',
+        'name_type': 'Fully Specified',
+        'locale': 'en',
+        'locale_preferred': True,
+        'external_id': None,
+    }
+    SHORT_NAME_TEMPLATE = {
+        'name': '',
+        'name_type': 'Short',
+        'locale': 'en',
+        'locale_preferred': False,
+        'external_id': None,
+    }
+    DESCRIPTION_TEMPLATE = {
+        'description': '',
+        'description_type': 'Description',
+        'locale': 'en',
+        'locale_preferred': True,
+        'external_id': None,
+    }
+
     def __init__(self, oclenv='', oclapitoken='', dhis2env='', dhis2uid='', dhis2pwd='',
                  compare2previousexport=True, run_dhis2_offline=False, run_ocl_offline=False,
                  verbosity=0, data_check_only=False, import_test_mode=False, import_limit=0):
@@ -70,12 +149,38 @@ class DatimSyncMer(datimsync.DatimSync):
         :param conversion_attr: Optional dictionary of attributes to pass to the conversion method
         :return: Boolean
         """
+        # NOTE: This transform is string/dict bound (JSON parsing plus building str-keyed
+        # dicts), so a Numba JIT would only run in object mode here and provide no
+        # speedup. If numeric per-record computation is ever added, isolate it into
+        # NumPy arrays (mapping string IDs to integer indexes up front) before
+        # considering a compiled kernel.
         dhis2filename_export_new = self.dhis2filename_export_new(dhis2_query_def['id'])
         with open(self.attach_absolute_data_path(dhis2filename_export_new), "rb") as input_file:
             self.vlog(1, 'Loading new DHIS2 export "%s"...' % dhis2filename_export_new)
-            new_dhis2_export = json.load(input_file)
+            # ijson streams one DataElement at a time so a country-sized export is never
+            # held in memory all at once. Fall back to parsing the full document with
+            # orjson (or stdlib json) if ijson is not installed.
+            if ijson:
+                data_elements = ijson.items(input_file, 'dataElements.item')
+            elif orjson:
+                data_elements = orjson.loads(input_file.read())['dataElements']
+            else:
+                data_elements = json.load(input_file)['dataElements']
             ocl_dataset_repos = conversion_attr['ocl_dataset_repos']
 
+            # Flatten the dataset-to-collection lookup so the dataset loop resolves a
+            # collection ID with one dict get instead of a membership test plus a
+            # nested dict access
+            collection_id_for_dataset = dict(
+                (dataset_id, repo['id']) for dataset_id, repo in ocl_dataset_repos.items())
+
+            # Bind the diff containers and reference builder to locals so the hot loop
+            # avoids repeating the attribute and nested dict lookups for every record
+            mer_diff = self.dhis2_diff[datimconstants.DatimConstants.IMPORT_BATCH_MER]
+            mer_concepts = mer_diff[self.RESOURCE_TYPE_CONCEPT]
+            mer_mappings = mer_diff[self.RESOURCE_TYPE_MAPPING]
+            mer_concept_refs = mer_diff[self.RESOURCE_TYPE_CONCEPT_REF]
+
             # Counts
             num_indicators = 0
             num_disaggregates = 0
@@ -83,141 +188,96 @@ class DatimSyncMer(datimsync.DatimSync):
             num_indicator_refs = 0
             num_disaggregate_refs = 0
 
+            # Disaggregate URLs already referenced, tracked per collection, so the dedup
+            # check probes a small set instead of the full concept-reference dict
+            seen_disaggregate_refs = collections.defaultdict(set)
+
             # Iterate through each DataElement and transform to an Indicator concept
-            for de in new_dhis2_export['dataElements']:
+            for de in data_elements:
                 indicator_concept_id = de['code']
-                indicator_concept_url = '/orgs/PEPFAR/sources/MER/concepts/' + indicator_concept_id + '/'
-                indicator_concept_key = indicator_concept_url
-                indicator_concept = {
-                    'type': 'Concept',
-                    'id': indicator_concept_id,
-                    'concept_class': 'Indicator',
-                    'datatype': 'Numeric',
-                    'owner': 'PEPFAR',
-                    'owner_type': self.RESOURCE_TYPE_ORGANIZATION,
-                    'source': 'MER',
-                    'retired': False,
-                    'external_id': de['id'],
-                    'descriptions': None,
-                    'extras': None,
-                    'names': [
-                        {
-                            'name': de['name'],
-                            'name_type': 'Fully Specified',
-                            'locale': 'en',
-                            'locale_preferred': True,
-                            'external_id': None,
-                        },
-                        {
-                            'name': de['shortName'],
-                            'name_type': 'Short',
-                            'locale': 'en',
-                            'locale_preferred': False,
-                            'external_id': None,
-                        }
-                    ],
-                }
+                indicator_concept_url = '%s%s/' % (DatimSyncMer.CONCEPT_URL_PREFIX, indicator_concept_id)
+                indicator_concept = DatimSyncMer.INDICATOR_CONCEPT_TEMPLATE.copy()
+                indicator_concept['id'] = indicator_concept_id
+                indicator_concept['external_id'] = de['id']
+                fully_specified_name = DatimSyncMer.FULLY_SPECIFIED_NAME_TEMPLATE.copy()
+                fully_specified_name['name'] = de['name']
+                short_name = DatimSyncMer.SHORT_NAME_TEMPLATE.copy()
+                short_name['name'] = de['shortName']
+                indicator_concept['names'] = [fully_specified_name, short_name]
                 if 'description' in de and de['description']:
-                    indicator_concept['descriptions'] = [
-                        {
-                            'description': de['description'],
-                            'description_type': 'Description',
-                            'locale': 'en',
-                            'locale_preferred': True,
-                            'external_id': None,
-                        }
-                    ]
-                self.dhis2_diff[datimconstants.DatimConstants.IMPORT_BATCH_MER][self.RESOURCE_TYPE_CONCEPT][
-                    indicator_concept_key] = indicator_concept
+                    indicator_description = DatimSyncMer.DESCRIPTION_TEMPLATE.copy()
+                    indicator_description['description'] = de['description']
+                    indicator_concept['descriptions'] = [indicator_description]
+                mer_concepts[indicator_concept_url] = indicator_concept
                 num_indicators += 1
 
                 # Build disaggregates concepts and mappings
                 indicator_disaggregate_concept_urls = []
                 for coc in de['categoryCombo']['categoryOptionCombos']:
                     disaggregate_concept_id = coc['id']  # "id" is the same as "code", but "code" is sometimes missing
-                    disaggregate_concept_url = '/orgs/PEPFAR/sources/MER/concepts/' + disaggregate_concept_id + '/'
-                    disaggregate_concept_key = disaggregate_concept_url
+                    disaggregate_concept_url = '%s%s/' % (
+                        DatimSyncMer.CONCEPT_URL_PREFIX, disaggregate_concept_id)
                     indicator_disaggregate_concept_urls.append(disaggregate_concept_url)
 
-                    # Only build the disaggregate concept if it has not already been defined
-                    if disaggregate_concept_key not in self.dhis2_diff[
-                            datimconstants.DatimConstants.IMPORT_BATCH_MER][self.RESOURCE_TYPE_CONCEPT]:
-                        disaggregate_concept = {
-                            'type': 'Concept',
-                            'id': disaggregate_concept_id,
-                            'concept_class': 'Disaggregate',
-                            'datatype': 'None',
-                            'owner': 'PEPFAR',
-                            'owner_type': self.RESOURCE_TYPE_ORGANIZATION,
-                            'source': 'MER',
-                            'retired': False,
-                            'descriptions': None,
-                            'external_id': coc['id'],
-                            'extras': None,
-                            'names': [
-                                {
-                                    'name': coc['name'],
-                                    'name_type': 'Fully Specified',
-                                    'locale': 'en',
-                                    'locale_preferred': True,
-                                    'external_id': None,
-                                }
-                            ]
-                        }
-                        self.dhis2_diff[datimconstants.DatimConstants.IMPORT_BATCH_MER][
-                            self.RESOURCE_TYPE_CONCEPT][disaggregate_concept_key] = disaggregate_concept
+                    # Only build the disaggregate concept if it has not already been
+                    # defined - duplicate disaggregates are the common case, so the
+                    # cheap membership probe skips the template copies and assignments
+                    if disaggregate_concept_url not in mer_concepts:
+                        disaggregate_concept = DatimSyncMer.DISAGGREGATE_CONCEPT_TEMPLATE.copy()
+                        disaggregate_concept['id'] = disaggregate_concept_id
+                        disaggregate_concept['external_id'] = coc['id']
+                        disaggregate_name = DatimSyncMer.FULLY_SPECIFIED_NAME_TEMPLATE.copy()
+                        disaggregate_name['name'] = coc['name']
+                        disaggregate_concept['names'] = [disaggregate_name]
+                        mer_concepts[disaggregate_concept_url] = disaggregate_concept
                         num_disaggregates += 1
 
                     # Build the mapping
                     map_type = 'Has Option'
-                    disaggregate_mapping_key = datimsync.DatimSync.get_mapping_key(
-                        mapping_owner_type=self.RESOURCE_TYPE_ORGANIZATION, mapping_owner_id='PEPFAR',
-                        mapping_source_id='MER', from_concept_url=indicator_concept_url, map_type=map_type,
-                        to_concept_url=disaggregate_concept_url)
-                    disaggregate_mapping = {
-                        'type': 'Mapping',
-                        'owner': 'PEPFAR',
-                        'owner_type': self.RESOURCE_TYPE_ORGANIZATION,
-                        'source': 'MER',
-                        'map_type': map_type,
-                        'from_concept_url': indicator_concept_url,
-                        'to_concept_url': disaggregate_concept_url,
-                        'external_id': None,
-                        'extras': None,
-                        'retired': False,
-                    }
-                    self.dhis2_diff[datimconstants.DatimConstants.IMPORT_BATCH_MER][
-                        self.RESOURCE_TYPE_MAPPING][disaggregate_mapping_key] = disaggregate_mapping
+                    disaggregate_mapping_key = '%s%s&maptype=%s&to=%s' % (
+                        DatimSyncMer.MAPPING_KEY_PREFIX, indicator_concept_url, map_type,
+                        disaggregate_concept_url)
+                    disaggregate_mapping = DatimSyncMer.DISAGGREGATE_MAPPING_TEMPLATE.copy()
+                    disaggregate_mapping['from_concept_url'] = indicator_concept_url
+                    disaggregate_mapping['to_concept_url'] = disaggregate_concept_url
+                    mer_mappings[disaggregate_mapping_key] = disaggregate_mapping
                     num_mappings += 1
 
                 # Iterate through DataSets to transform to build references
                 # NOTE: References are created for the indicator as well as each of its disaggregates and mappings
                 for dse in de['dataSetElements']:
-                    ds = dse['dataSet']
-
-                    # Confirm that this dataset is one of the ones that we're interested in
-                    if ds['id'] not in ocl_dataset_repos:
+                    # Skip datasets that are not one of the ones that we're interested in
+                    collection_id = collection_id_for_dataset.get(dse['dataSet']['id'])
+                    if collection_id is None:
                         continue
-                    collection_id = ocl_dataset_repos[ds['id']]['id']
+
+                    # Build the reference fields shared by the indicator and all of its
+                    # disaggregates once per collection instead of calling
+                    # get_concept_reference_json() for every concept URL. The keys and
+                    # JSON produced here are identical to that method's output.
+                    collection_url = '/orgs/PEPFAR/collections/%s/' % collection_id
+                    reference_key_prefix = '%sreferences/?concept=' % collection_url
 
                     # Build the Indicator concept reference - mappings for this reference will be added automatically
-                    indicator_ref_key, indicator_ref = self.get_concept_reference_json(
-                        collection_owner_id='PEPFAR', collection_owner_type=self.RESOURCE_TYPE_ORGANIZATION,
-                        collection_id=collection_id, concept_url=indicator_concept_url)
-                    self.dhis2_diff[datimconstants.DatimConstants.IMPORT_BATCH_MER][self.RESOURCE_TYPE_CONCEPT_REF][
-                        indicator_ref_key] = indicator_ref
+                    mer_concept_refs[reference_key_prefix + indicator_concept_url] = {
+                        'type': 'Reference',
+                        'collection_url': collection_url,
+                        'data': {"expressions": [indicator_concept_url]},
+                    }
                     num_indicator_refs += 1
 
                     # Build the Disaggregate concept reference
+                    referenced_disaggregates = seen_disaggregate_refs[collection_id]
                     for disaggregate_concept_url in indicator_disaggregate_concept_urls:
-                        disaggregate_ref_key, disaggregate_ref = self.get_concept_reference_json(
-                            collection_owner_id='PEPFAR', collection_owner_type=self.RESOURCE_TYPE_ORGANIZATION,
-                            collection_id=collection_id, concept_url=disaggregate_concept_url)
-                        if disaggregate_ref_key not in self.dhis2_diff[
-                                datimconstants.DatimConstants.IMPORT_BATCH_MER][self.RESOURCE_TYPE_CONCEPT_REF]:
-                            self.dhis2_diff[datimconstants.DatimConstants.IMPORT_BATCH_MER][self.RESOURCE_TYPE_CONCEPT_REF][
-                                disaggregate_ref_key] = disaggregate_ref
-                            num_disaggregate_refs += 1
+                        if disaggregate_concept_url in referenced_disaggregates:
+                            continue
+                        referenced_disaggregates.add(disaggregate_concept_url)
+                        mer_concept_refs[reference_key_prefix + disaggregate_concept_url] = {
+                            'type': 'Reference',
+                            'collection_url': collection_url,
+                            'data': {"expressions": [disaggregate_concept_url]},
+                        }
+                        num_disaggregate_refs += 1
 
             self.vlog(1, 'DHIS2 export "%s" successfully transformed to %s indicator concepts, '
                          '%s disaggregate concepts, %s mappings from indicators to disaggregates, '
@@ -38,22 +38,22 @@ ocl_api_token = settings.api_token_staging_aws_datim_admin
 # Build a combined resource list
 resource_list = ocldev.oclresourcelist.OclJsonResourceList()
 for import_filename in import_filenames:
-    resource_list += ocldev.oclresourcelist.OclJsonResourceList.load_from_file(
-        filename=import_filename)
-print '%s resources will be imported:' % len(resource_list)
+    resource_list.append(ocldev.oclresourcelist.OclJsonResourceList.load_from_file(
+        filename=import_filename))
+print('%s resources will be imported:' % len(resource_list))
 #pprint.pprint(resource_list.summarize(core_attr_key='type'))
 
 # Process as bulk import
 if resource_list:
-    print 'Submitting bulk import to: %s' % ocl_api_url_root
+    print('Submitting bulk import to: %s' % ocl_api_url_root)
     bulk_import_response = ocldev.oclfleximporter.OclBulkImporter.post(
         input_list=resource_list, api_token=ocl_api_token, api_url_root=ocl_api_url_root)
     task_id = bulk_import_response.json()['task']
-    print 'BULK IMPORT TASK ID: %s' % task_id
+    print('BULK IMPORT TASK ID: %s' % task_id)
     if do_wait_until_import_complete:
-        print 'INFO: Waiting until import is complete...'
+        print('INFO: Waiting until import is complete...')
         import_results = ocldev.oclfleximporter.OclBulkImporter.get_bulk_import_results(
             task_id=task_id, api_url_root=ocl_api_url_root, api_token=ocl_api_token,
             delay_seconds=5, max_wait_seconds=800)
         if import_results:
-            print import_results.display_report()
+            print(import_results.display_report())